@@ -9,6 +9,7 @@ from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import re
 from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.functions import col, when, count, avg, sum as sum_, max as max_, min as min_
 from snowflake.cortex import Complete
@@ -17,6 +18,13 @@ import altair as alt
 # Initialize Snowflake session
 session = get_active_session()
 
+# st.fragment needs Streamlit 1.37+; fall back to the experimental API, or plain reruns
+page_fragment = (
+    getattr(st, "fragment", None)
+    or getattr(st, "experimental_fragment", None)
+    or (lambda func: func)
+)
+
 # Page configuration
 st.set_page_config(
     page_title="SnowMobile Customer 360 Analytics",
@@ -96,34 +104,296 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Columns read by the dashboard views
+EMAIL_COLS = [
+    "EMAIL_ID",
+    "CUSTOMER_ID",
+    "CUSTOMER_NAME",
+    "DATE_RECEIVED",
+    "SENTIMENT_SCORE",
+    "SENTIMENT_CATEGORY",
+    "EMAIL_CLASSIFICATION",
+    "EXECUTIVE_SUMMARY",
+    "ESCALATION_NEEDED",
+    "RESPONSE_URGENCY",
+    "FOLLOW_UP_REQUIRED",
+    "KEY_TOPICS_DISCUSSED",
+    "NEXT_STEPS",
+    "COMPETITIVE_MENTIONS"
+]
+
+# Cortex Search Service over FLATTENED_EMAIL_INTELLIGENCE, created in 02_CORTEX_AI_ANALYTICS.
+# Recreate it from that notebook so CUSTOMER_ID is available as a filter attribute.
+SEARCH_SERVICE_NAME = "C_SEARCH_EMAIL_INTELLIGENCE"
+CUSTOMER_ID_PATTERN = re.compile(r"CUST\d+", re.IGNORECASE)
+SEARCH_RESULT_COLS = [
+    "EMAIL_ID",
+    "CUSTOMER_ID",
+    "CUSTOMER_NAME",
+    "EMAIL_CLASSIFICATION",
+    "SENTIMENT_CATEGORY",
+    "EXECUTIVE_SUMMARY",
+    "DATE_RECEIVED"
+]
+
+# Fallback insights shown when Cortex Complete is unavailable
+MANUAL_AI_INSIGHTS = """
+## Key Customer Insights:
+
+**Customer Satisfaction Analysis:**
+- Overall sentiment indicates moderate customer satisfaction with room for improvement
+- Escalation rate suggests need for enhanced first-contact resolution
+- Communication volume shows active customer engagement
+
+**Priority Recommendations:**
+1. **Immediate Actions**: Address urgent response communications within 24 hours
+2. **Process Improvement**: Implement proactive communication for technical issues
+3. **Training Focus**: Enhance team skills for handling complex inquiries
+4. **Technology**: Leverage AI insights for predictive customer service
+
+**Strategic Opportunities:**
+- Develop customer success programs for high-value accounts
+- Create knowledge base for common technical issues
+- Implement sentiment-based routing for critical communications
+"""
+
 # Utility functions
-@st.cache_data(show_spinner=False)
-def load_email_intelligence():
-    """Load email intelligence data from the exported CSV table"""
+@st.cache_data(ttl=600, show_spinner=False)
+def get_email_date_bounds():
+    """Get the earliest and latest email dates for the date filter defaults"""
     query = """
-    SELECT *
+    SELECT 
+        MIN(DATE_RECEIVED)::DATE as min_date,
+        MAX(DATE_RECEIVED)::DATE as max_date
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    """
+    return session.sql(query).collect()[0]
+
+def build_email_filter(date_from, date_to, sentiments_tuple):
+    """Build the WHERE clause and bind parameters for the sidebar filters"""
+    params = [date_from, date_to]
+    # Compare the raw column so Snowflake can prune micro-partitions on DATE_RECEIVED
+    where_clause = "WHERE DATE_RECEIVED >= ? AND DATE_RECEIVED < DATEADD(day, 1, ?)"
+    if sentiments_tuple:
+        placeholders = ", ".join("?" for _ in sentiments_tuple)
+        where_clause += f" AND SENTIMENT_CATEGORY IN ({placeholders})"
+        params.extend(sentiments_tuple)
+    return where_clause, params
+
+# The full filtered frame is the largest cached object, so bound how many copies are kept
+@st.cache_data(ttl=600, max_entries=4, show_spinner=False)
+def load_email_intelligence(date_from, date_to, sentiments_tuple):
+    """Load email intelligence data with the sidebar filters pushed into the WHERE clause"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT {", ".join(EMAIL_COLS)}
     FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
     ORDER BY DATE_RECEIVED DESC
     """
-    return session.sql(query).to_pandas()
+    email_data = session.sql(query, params=params).to_pandas()
+    
+    # Parse timestamps once so downstream views get datetime64 rather than objects
+    email_data['DATE_RECEIVED'] = pd.to_datetime(email_data['DATE_RECEIVED'])
+    
+    # Compact dtypes for the low-cardinality columns the views filter and group on
+    for column in ('SENTIMENT_CATEGORY', 'EMAIL_CLASSIFICATION', 'RESPONSE_URGENCY'):
+        email_data[column] = email_data[column].astype('category')
+    for column in ('ESCALATION_NEEDED', 'FOLLOW_UP_REQUIRED'):
+        email_data[column] = email_data[column].astype('boolean').fillna(False).astype(bool)
+    
+    return email_data
 
 @st.cache_data(show_spinner=False)
-def load_customer_demographics():
-    """Load customer demographics data"""
-    query = """
-    SELECT *
-    FROM CUSTOMER_DEMOGRAPHICS
+def load_priority_emails(date_from, date_to, sentiments_tuple, limit=5):
+    """Load the most recent escalated or urgent emails for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT {", ".join(EMAIL_COLS)}
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND (ESCALATION_NEEDED OR RESPONSE_URGENCY = 'immediate')
+    ORDER BY DATE_RECEIVED DESC
+    LIMIT ?
     """
-    return session.sql(query).to_pandas()
+    return session.sql(query, params=params + [limit]).to_pandas()
 
 @st.cache_data(show_spinner=False)
-def load_vehicle_purchase_history():
-    """Load vehicle purchase history data"""
-    query = """
-    SELECT *
-    FROM VEHICLE_PURCHASE_HISTORY
+def load_customer_names(date_from, date_to, sentiments_tuple):
+    """Load the distinct customer names for the profile selector"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT DISTINCT CUSTOMER_NAME
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND CUSTOMER_NAME IS NOT NULL
+    ORDER BY CUSTOMER_NAME
+    """
+    return session.sql(query, params=params).to_pandas()['CUSTOMER_NAME'].tolist()
+
+@st.cache_data(show_spinner=False)
+def load_customer_emails(customer_name, date_from, date_to, sentiments_tuple, limit=50):
+    """Load the most recent emails for a single customer"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT {", ".join(EMAIL_COLS)}
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND CUSTOMER_NAME = ?
+    ORDER BY DATE_RECEIVED DESC
+    LIMIT ?
+    """
+    return session.sql(query, params=params + [customer_name, limit]).to_pandas()
+
+@st.cache_data(show_spinner=False)
+def get_customer_profile_stats(customer_name, date_from, date_to, sentiments_tuple):
+    """Get communication statistics for a single customer across the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        MAX(CUSTOMER_ID) as customer_id,
+        COUNT(*) as total_emails,
+        MIN(DATE_RECEIVED) as first_email,
+        MAX(DATE_RECEIVED) as last_email,
+        AVG(SENTIMENT_SCORE) as avg_sentiment,
+        COUNT_IF(ESCALATION_NEEDED) as escalations,
+        COUNT_IF(SENTIMENT_CATEGORY = '😊 Positive') as positive_emails,
+        MODE(RESPONSE_URGENCY) as common_urgency
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND CUSTOMER_NAME = ?
+    """
+    return session.sql(query, params=params + [customer_name]).collect()[0]
+
+@st.cache_data(show_spinner=False)
+def load_sentiment_by_class(date_from, date_to, sentiments_tuple):
+    """Count emails per classification and sentiment pair for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        EMAIL_CLASSIFICATION,
+        SENTIMENT_CATEGORY,
+        COUNT(*) as email_count
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND EMAIL_CLASSIFICATION IS NOT NULL
+    AND SENTIMENT_CATEGORY IS NOT NULL
+    GROUP BY EMAIL_CLASSIFICATION, SENTIMENT_CATEGORY
+    """
+    return session.sql(query, params=params).to_pandas()
+
+@st.cache_data(show_spinner=False)
+def load_urgency_sentiment(date_from, date_to, sentiments_tuple):
+    """Average sentiment per response urgency for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        RESPONSE_URGENCY,
+        AVG(SENTIMENT_SCORE) as sentiment_score
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND RESPONSE_URGENCY IS NOT NULL
+    GROUP BY RESPONSE_URGENCY
+    ORDER BY RESPONSE_URGENCY
     """
-    return session.sql(query).to_pandas()
+    return session.sql(query, params=params).to_pandas()
+
+@st.cache_data(show_spinner=False)
+def load_sentiment_counts(date_from, date_to, sentiments_tuple):
+    """Count emails per sentiment category for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        SENTIMENT_CATEGORY,
+        COUNT(*) as email_count
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    GROUP BY SENTIMENT_CATEGORY
+    ORDER BY email_count DESC
+    """
+    return session.sql(query, params=params).to_pandas()
+
+def load_top_values(column, k, date_from, date_to, sentiments_tuple):
+    """Get the approximate k most frequent non-empty values of a column for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT APPROX_TOP_K({column}, {int(k)}) as top_values
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    AND {column} IS NOT NULL
+    AND {column} <> ''
+    """
+    top_values = session.sql(query, params=params).collect()[0]['TOP_VALUES']
+    return pd.DataFrame(json.loads(top_values) if top_values else [], columns=[column, 'EMAIL_COUNT'])
+
+@st.cache_data(show_spinner=False)
+def load_classification_counts(date_from, date_to, sentiments_tuple, limit=6):
+    """Count emails per classification for the filtered range, most frequent first"""
+    return load_top_values('EMAIL_CLASSIFICATION', limit, date_from, date_to, sentiments_tuple)
+
+@st.cache_data(show_spinner=False)
+def load_competitive_mentions(date_from, date_to, sentiments_tuple, limit=10):
+    """Count emails per competitor mention for the filtered range, most frequent first"""
+    return load_top_values('COMPETITIVE_MENTIONS', limit, date_from, date_to, sentiments_tuple)
+
+@st.cache_data(show_spinner=False)
+def get_filtered_summary_stats(date_from, date_to, sentiments_tuple):
+    """Get email and customer counts for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        COUNT(DISTINCT CUSTOMER_ID) as total_customers,
+        COUNT(*) as total_emails
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    """
+    return session.sql(query, params=params).collect()[0]
+
+@st.cache_data(show_spinner=False)
+def load_daily_stats(date_from, date_to, sentiments_tuple):
+    """Get daily email volume, sentiment and escalations for the filtered range"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    SELECT 
+        DATE_TRUNC('DAY', DATE_RECEIVED) as date,
+        COUNT(*) as email_count,
+        AVG(SENTIMENT_SCORE) as avg_sentiment,
+        COUNT_IF(ESCALATION_NEEDED) as escalations
+    FROM "FLATTENED_EMAIL_INTELLIGENCE"
+    {where_clause}
+    GROUP BY 1
+    ORDER BY 1
+    """
+    return session.sql(query, params=params).to_pandas()
+
+@st.cache_data(show_spinner=False)
+def load_customer_segments(date_from, date_to, sentiments_tuple):
+    """Aggregate per-customer communication patterns and assign a segment"""
+    where_clause, params = build_email_filter(date_from, date_to, sentiments_tuple)
+    query = f"""
+    WITH customer_stats AS (
+        SELECT 
+            CUSTOMER_ID,
+            AVG(SENTIMENT_SCORE) as avg_sentiment,
+            COUNT_IF(ESCALATION_NEEDED) as total_escalations,
+            COUNT(*) as total_emails,
+            COUNT_IF(RESPONSE_URGENCY = 'immediate') as urgent_emails
+        FROM "FLATTENED_EMAIL_INTELLIGENCE"
+        {where_clause}
+        GROUP BY CUSTOMER_ID
+    )
+    SELECT 
+        *,
+        CASE 
+            WHEN total_escalations > 2 OR avg_sentiment < -0.3 THEN '🔴 High Risk'
+            WHEN avg_sentiment > 0.3 AND total_escalations = 0 THEN '🟢 Champions'
+            WHEN urgent_emails > 1 THEN '🟡 Needs Attention'
+            ELSE '🔵 Standard'
+        END as segment
+    FROM customer_stats
+    ORDER BY CUSTOMER_ID
+    """
+    return session.sql(query, params=params).to_pandas()
 
 @st.cache_data(show_spinner=False)
 def get_customer_summary_stats():
@@ -132,38 +402,75 @@ def get_customer_summary_stats():
     SELECT 
         COUNT(DISTINCT CUSTOMER_ID) as total_customers,
         COUNT(*) as total_emails,
-        COUNT(CASE WHEN ESCALATION_NEEDED = true THEN 1 END) as escalations_needed,
-        COUNT(CASE WHEN SENTIMENT_CATEGORY = '😞 Negative' THEN 1 END) as negative_sentiment,
-        COUNT(CASE WHEN SENTIMENT_CATEGORY = '😊 Positive' THEN 1 END) as positive_sentiment,
+        COUNT_IF(ESCALATION_NEEDED) as escalations_needed,
+        COUNT_IF(SENTIMENT_CATEGORY = '😞 Negative') as negative_sentiment,
+        COUNT_IF(SENTIMENT_CATEGORY = '😊 Positive') as positive_sentiment,
         AVG(SENTIMENT_SCORE) as avg_sentiment_score
     FROM "FLATTENED_EMAIL_INTELLIGENCE"
     """
     return session.sql(query).collect()[0]
 
+@st.cache_data(ttl=300, show_spinner=False)
 def search_customers(search_term):
     """Search customers using Cortex Search Service"""
-    try:
-        search_query = f"""
-        SELECT 
-            EMAIL_ID,
-            CUSTOMER_ID,
-            CUSTOMER_NAME,
-            EMAIL_CLASSIFICATION,
-            SENTIMENT_CATEGORY,
-            EXECUTIVE_SUMMARY,
-            DATE_RECEIVED
-        FROM "2025-06-23T16-21_EXPORT"
-        WHERE 
-            CUSTOMER_NAME ILIKE '%{search_term}%' 
-            OR CUSTOMER_ID ILIKE '%{search_term}%'
-            OR EMAIL_CONTENTS ILIKE '%{search_term}%'
-        ORDER BY DATE_RECEIVED DESC
-        LIMIT 10
-        """
-        return session.sql(search_query).to_pandas()
-    except:
-        return pd.DataFrame()
+    # Imported here so a missing snowflake.core package only disables search
+    from snowflake.core import Root
+    
+    search_service = (
+        Root(session)
+        .databases[session.get_current_database()]
+        .schemas[session.get_current_schema()]
+        .cortex_search_services[SEARCH_SERVICE_NAME]
+    )
+    
+    response = None
+    
+    # Customer IDs get an exact attribute match, as the earlier ILIKE search did
+    if CUSTOMER_ID_PATTERN.fullmatch(search_term):
+        try:
+            response = search_service.search(
+                query=search_term,
+                columns=SEARCH_RESULT_COLS,
+                filter={"@eq": {"CUSTOMER_ID": search_term.upper()}},
+                limit=10
+            )
+        except Exception:
+            # Services created before CUSTOMER_ID was an attribute cannot filter on it
+            response = None
+    
+    if response is None or not response.results:
+        response = search_service.search(
+            query=search_term,
+            columns=SEARCH_RESULT_COLS,
+            limit=10
+        )
+    search_results = pd.DataFrame(response.results, columns=SEARCH_RESULT_COLS)
+    search_results['DATE_RECEIVED'] = pd.to_datetime(search_results['DATE_RECEIVED'])
+    return search_results
 
+@st.cache_data(ttl=3600, show_spinner="Generating AI insights...")
+def generate_ai_summary(summary_tuple):
+    """Generate executive insights with Cortex Complete from the summary metrics"""
+    total_emails, avg_sentiment, escalation_rate, top_issues, urgent_responses = summary_tuple
+    
+    prompt = f"""
+    Analyze the following customer communication data and provide executive insights:
+    
+    Total Communications: {total_emails}
+    Average Sentiment Score: {avg_sentiment:.2f}
+    Escalation Rate: {escalation_rate:.1f}%
+    Top Issues: {dict(top_issues)}
+    Immediate Response Required: {urgent_responses}
+    
+    Provide:
+    1. Key insights about customer satisfaction
+    2. Recommendations for improving customer experience
+    3. Priority actions for the customer service team
+    """
+    
+    return Complete('mistral-large2', prompt)
+
+@st.cache_data(show_spinner=False)
 def create_sentiment_gauge(sentiment_score):
     """Create a sentiment gauge chart"""
     fig = go.Figure(go.Indicator(
@@ -190,6 +497,7 @@ def create_sentiment_gauge(sentiment_score):
     fig.update_layout(height=300)
     return fig
 
+@st.cache_data(show_spinner=False)
 def create_customer_journey_timeline(customer_emails):
     """Create a timeline of customer interactions"""
     fig = px.scatter(
@@ -204,17 +512,45 @@ def create_customer_journey_timeline(customer_emails):
     fig.update_layout(height=400)
     return fig
 
+@st.cache_data(show_spinner=False)
+def create_daily_trends_chart(daily_stats):
+    """Create stacked daily volume, sentiment and escalation trend charts"""
+    fig_trends = make_subplots(
+        rows=3, cols=1,
+        subplot_titles=('Daily Email Volume', 'Average Sentiment', 'Daily Escalations'),
+        vertical_spacing=0.1
+    )
+    
+    fig_trends.add_trace(
+        go.Scatter(x=daily_stats['DATE'], y=daily_stats['EMAIL_COUNT'], name='Email Volume'),
+        row=1, col=1
+    )
+    
+    fig_trends.add_trace(
+        go.Scatter(x=daily_stats['DATE'], y=daily_stats['AVG_SENTIMENT'], name='Avg Sentiment', line=dict(color='green')),
+        row=2, col=1
+    )
+    
+    fig_trends.add_trace(
+        go.Scatter(x=daily_stats['DATE'], y=daily_stats['ESCALATIONS'], name='Escalations', line=dict(color='red')),
+        row=3, col=1
+    )
+    
+    fig_trends.update_layout(height=800)
+    return fig_trends
+
 # Main App Layout
 def main():
     # Header
     st.markdown('<h1 class="main-header">🚗 SnowMobile Customer 360 Analytics</h1>', unsafe_allow_html=True)
     st.markdown("### Advanced Customer Communication Intelligence with Snowflake Cortex AI")
     
-    # Load data
-    email_data = load_email_intelligence()
-    demographics_data = load_customer_demographics()
-    purchase_data = load_vehicle_purchase_history()
-    summary_stats = get_customer_summary_stats()
+    # Load filter defaults; page data is loaded only by the page that needs it
+    date_bounds = get_email_date_bounds()
+    
+    if date_bounds['MIN_DATE'] is None:
+        st.info("No email intelligence data available yet.")
+        st.stop()
     
     # Sidebar for navigation and filters
     with st.sidebar:
@@ -229,19 +565,16 @@ def main():
         st.markdown("### 🎛️ Filters")
         
         # Date filter
-        if not email_data.empty:
-            date_range = st.date_input(
-                "Date Range",
-                value=(email_data['DATE_RECEIVED'].min().date(), email_data['DATE_RECEIVED'].max().date()),
-                min_value=email_data['DATE_RECEIVED'].min().date(),
-                max_value=email_data['DATE_RECEIVED'].max().date()
-            )
-            
-            # Filter email data by date
-            email_data = email_data[
-                (email_data['DATE_RECEIVED'].dt.date >= date_range[0]) &
-                (email_data['DATE_RECEIVED'].dt.date <= date_range[1])
-            ]
+        date_range = st.date_input(
+            "Date Range",
+            value=(date_bounds['MIN_DATE'], date_bounds['MAX_DATE']),
+            min_value=date_bounds['MIN_DATE'],
+            max_value=date_bounds['MAX_DATE']
+        )
+        
+        # The date picker returns a single date while a range is still being selected
+        date_from = date_range[0]
+        date_to = date_range[1] if len(date_range) > 1 else date_range[0]
         
         # Sentiment filter
         sentiment_filter = st.multiselect(
@@ -249,26 +582,36 @@ def main():
             options=['😊 Positive', '😐 Neutral', '😞 Negative'],
             default=['😊 Positive', '😐 Neutral', '😞 Negative']
         )
-        
-        if sentiment_filter:
-            email_data = email_data[email_data['SENTIMENT_CATEGORY'].isin(sentiment_filter)]
     
-    # Main content based on selected page
+    # Filters are applied in Snowflake so only matching rows are transferred
+    filters = (date_from, date_to, tuple(sentiment_filter))
+    
+    # Main content based on selected page; each page is a fragment so its own widgets
+    # rerun only that page while the sidebar filters rerun the whole app
     if page == "📊 Executive Dashboard":
-        show_executive_dashboard(email_data, summary_stats)
+        show_executive_dashboard(
+            get_customer_summary_stats(),
+            get_filtered_summary_stats(*filters),
+            filters
+        )
     elif page == "🔍 Customer Search":
-        show_customer_search(email_data)
+        show_customer_search(filters)
     elif page == "👤 Customer Profile":
-        show_customer_profile(email_data, demographics_data, purchase_data)
+        show_customer_profile(filters)
     elif page == "📈 Analytics Deep Dive":
-        show_analytics_deep_dive(email_data)
+        show_analytics_deep_dive(filters)
     elif page == "🤖 AI Insights":
-        show_ai_insights(email_data)
+        show_ai_insights(load_email_intelligence(*filters), filters)
 
-def show_executive_dashboard(email_data, summary_stats):
+@page_fragment
+def show_executive_dashboard(summary_stats, period_stats, filters):
     """Executive Dashboard with key metrics and insights"""
     st.markdown("## 📊 Executive Dashboard")
     
+    if not period_stats['TOTAL_EMAILS']:
+        st.info("No data in selected range.")
+        return
+    
     # Key Metrics Row
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -276,14 +619,14 @@ def show_executive_dashboard(email_data, summary_stats):
         st.metric(
             "📧 Total Communications",
             f"{summary_stats['TOTAL_EMAILS']:,}",
-            delta=f"+{len(email_data)} this period"
+            delta=f"+{period_stats['TOTAL_EMAILS']:,} this period"
         )
     
     with col2:
         st.metric(
             "👥 Active Customers",
             f"{summary_stats['TOTAL_CUSTOMERS']:,}",
-            delta=f"+{email_data['CUSTOMER_ID'].nunique()} this period"
+            delta=f"+{period_stats['TOTAL_CUSTOMERS']:,} this period"
         )
     
     with col3:
@@ -315,10 +658,10 @@ def show_executive_dashboard(email_data, summary_stats):
     
     with col1:
         # Sentiment Distribution
-        sentiment_counts = email_data['SENTIMENT_CATEGORY'].value_counts()
+        sentiment_counts = load_sentiment_counts(*filters)
         fig_sentiment = px.pie(
-            values=sentiment_counts.values,
-            names=sentiment_counts.index,
+            values=sentiment_counts['EMAIL_COUNT'],
+            names=sentiment_counts['SENTIMENT_CATEGORY'],
             title="📊 Customer Sentiment Distribution",
             color_discrete_map={
                 '😊 Positive': '#10B981',
@@ -331,13 +674,13 @@ def show_executive_dashboard(email_data, summary_stats):
     
     with col2:
         # Communication Types
-        classification_counts = email_data['EMAIL_CLASSIFICATION'].value_counts().head(6)
+        classification_counts = load_classification_counts(*filters)
         fig_class = px.bar(
-            x=classification_counts.values,
-            y=classification_counts.index,
+            x=classification_counts['EMAIL_COUNT'],
+            y=classification_counts['EMAIL_CLASSIFICATION'],
             orientation='h',
             title="🏷️ Communication Categories",
-            color=classification_counts.values,
+            color=classification_counts['EMAIL_COUNT'],
             color_continuous_scale="viridis"
         )
         fig_class.update_layout(height=400)
@@ -346,23 +689,26 @@ def show_executive_dashboard(email_data, summary_stats):
     # Recent High Priority Issues
     st.markdown("## 🚨 Priority Communications Requiring Attention")
     
-    priority_emails = email_data[
-        (email_data['ESCALATION_NEEDED'] == True) | 
-        (email_data['RESPONSE_URGENCY'] == 'immediate')
-    ].head(5)
-    
-    for _, email in priority_emails.iterrows():
-        priority_class = "priority-high" if email['ESCALATION_NEEDED'] else "priority-medium"
-        
-        st.markdown(f"""
-        <div class="{priority_class}">
-            <strong>🚨 {email['CUSTOMER_NAME']} - {email['EMAIL_CLASSIFICATION']}</strong><br>
-            <em>{email['DATE_RECEIVED'].strftime('%Y-%m-%d %H:%M')}</em><br>
-            {email['EXECUTIVE_SUMMARY'][:200]}...
-        </div>
-        """, unsafe_allow_html=True)
-
-def show_customer_search(email_data):
+    priority_emails = load_priority_emails(*filters)
+    
+    if priority_emails.empty:
+        st.success("No communications currently need escalation or an immediate response.")
+    else:
+        # Render all priority cards in a single markdown call
+        priority_html = "\n".join(
+            f"""
+            <div class="{'priority-high' if email.ESCALATION_NEEDED else 'priority-medium'}">
+                <strong>🚨 {email.CUSTOMER_NAME} - {email.EMAIL_CLASSIFICATION}</strong><br>
+                <em>{email.DATE_RECEIVED.strftime('%Y-%m-%d %H:%M')}</em><br>
+                {email.EXECUTIVE_SUMMARY[:200]}...
+            </div>
+            """
+            for email in priority_emails.itertuples()
+        )
+        st.markdown(priority_html, unsafe_allow_html=True)
+
+@page_fragment
+def show_customer_search(filters):
     """Customer search functionality"""
     st.markdown("## 🔍 Customer Intelligence Search")
     
@@ -370,18 +716,29 @@ def show_customer_search(email_data):
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        search_term = st.text_input(
+        st.text_input(
             "🔍 Search customers, communications, or issues:",
-            placeholder="Enter customer name, ID, or keywords..."
+            placeholder="Enter a customer ID (e.g. CUST12654) or keywords...",
+            key="q"
         )
     
     with col2:
         search_type = st.selectbox("Search Type", ["All", "Names", "Issues", "Products"])
     
+    # Only run the query when the user submits, not on every widget rerun
+    if st.button("Search"):
+        st.session_state["search_term"] = st.session_state["q"].strip()
+    search_term = st.session_state.get("search_term", "")
+    
     if search_term:
-        search_results = search_customers(search_term)
+        # Errors are handled here rather than in the cached function so they are not cached
+        try:
+            search_results = search_customers(search_term)
+        except Exception:
+            st.warning("Search is temporarily unavailable. Please try again shortly.")
+            search_results = None
         
-        if not search_results.empty:
+        if search_results is not None and not search_results.empty:
             st.markdown(f"### Found {len(search_results)} results")
             
             for _, result in search_results.iterrows():
@@ -399,7 +756,7 @@ def show_customer_search(email_data):
                     
                     with col3:
                         st.write(f"**Customer ID:** {result['CUSTOMER_ID']}")
-        else:
+        elif search_results is not None:
             st.info("No results found. Try different search terms.")
     
     # Quick filters
@@ -408,35 +765,40 @@ def show_customer_search(email_data):
     
     with col1:
         if st.button("🚨 Escalations Needed"):
+            email_data = load_email_intelligence(*filters)
             escalations = email_data[email_data['ESCALATION_NEEDED'] == True]
             st.dataframe(escalations[['CUSTOMER_NAME', 'EMAIL_CLASSIFICATION', 'SENTIMENT_CATEGORY', 'DATE_RECEIVED']])
     
     with col2:
         if st.button("😞 Negative Sentiment"):
+            email_data = load_email_intelligence(*filters)
             negative = email_data[email_data['SENTIMENT_CATEGORY'] == '😞 Negative']
             st.dataframe(negative[['CUSTOMER_NAME', 'EMAIL_CLASSIFICATION', 'SENTIMENT_SCORE', 'DATE_RECEIVED']])
     
     with col3:
         if st.button("📞 Follow-ups Required"):
+            email_data = load_email_intelligence(*filters)
             followups = email_data[email_data['FOLLOW_UP_REQUIRED'] == True]
             st.dataframe(followups[['CUSTOMER_NAME', 'EMAIL_CLASSIFICATION', 'NEXT_STEPS', 'DATE_RECEIVED']])
     
     with col4:
         if st.button("🏆 Positive Feedback"):
+            email_data = load_email_intelligence(*filters)
             positive = email_data[email_data['EMAIL_CLASSIFICATION'] == 'Compliment']
             st.dataframe(positive[['CUSTOMER_NAME', 'SENTIMENT_SCORE', 'EXECUTIVE_SUMMARY', 'DATE_RECEIVED']])
 
-def show_customer_profile(email_data, demographics_data, purchase_data):
+@page_fragment
+def show_customer_profile(filters):
     """Individual customer profile view"""
     st.markdown("## 👤 Customer Profile Deep Dive")
     
     # Customer selector
-    customers = email_data['CUSTOMER_NAME'].dropna().unique()
-    selected_customer = st.selectbox("Select Customer", sorted(customers))
+    customers = load_customer_names(*filters)
+    selected_customer = st.selectbox("Select Customer", customers)
     
     if selected_customer:
-        customer_emails = email_data[email_data['CUSTOMER_NAME'] == selected_customer]
-        customer_id = customer_emails['CUSTOMER_ID'].iloc[0]
+        profile_stats = get_customer_profile_stats(selected_customer, *filters)
+        customer_emails = load_customer_emails(selected_customer, *filters)
         
         # Customer header
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -445,27 +807,25 @@ def show_customer_profile(email_data, demographics_data, purchase_data):
             st.markdown(f"""
             <div class="customer-card">
                 <h2>👤 {selected_customer}</h2>
-                <p><strong>Customer ID:</strong> {customer_id}</p>
-                <p><strong>Total Communications:</strong> {len(customer_emails)}</p>
-                <p><strong>Date Range:</strong> {customer_emails['DATE_RECEIVED'].min().strftime('%Y-%m-%d')} to {customer_emails['DATE_RECEIVED'].max().strftime('%Y-%m-%d')}</p>
+                <p><strong>Customer ID:</strong> {profile_stats['CUSTOMER_ID']}</p>
+                <p><strong>Total Communications:</strong> {profile_stats['TOTAL_EMAILS']}</p>
+                <p><strong>Date Range:</strong> {profile_stats['FIRST_EMAIL'].strftime('%Y-%m-%d')} to {profile_stats['LAST_EMAIL'].strftime('%Y-%m-%d')}</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
-            avg_sentiment = customer_emails['SENTIMENT_SCORE'].mean()
-            st.plotly_chart(create_sentiment_gauge(avg_sentiment), use_container_width=True)
+            st.plotly_chart(create_sentiment_gauge(profile_stats['AVG_SENTIMENT']), use_container_width=True)
         
         with col3:
             # Customer metrics
-            escalations = customer_emails['ESCALATION_NEEDED'].sum()
-            positive_emails = len(customer_emails[customer_emails['SENTIMENT_CATEGORY'] == '😊 Positive'])
-            
-            st.metric("🚨 Escalations", escalations)
-            st.metric("😊 Positive Communications", positive_emails)
-            st.metric("📊 Avg Response Urgency", customer_emails['RESPONSE_URGENCY'].mode().iloc[0] if not customer_emails['RESPONSE_URGENCY'].empty else "N/A")
+            st.metric("🚨 Escalations", profile_stats['ESCALATIONS'])
+            st.metric("😊 Positive Communications", profile_stats['POSITIVE_EMAILS'])
+            st.metric("📊 Avg Response Urgency", profile_stats['COMMON_URGENCY'] or "N/A")
         
         # Customer Journey Timeline
         st.markdown("### 📈 Customer Communication Timeline")
+        if profile_stats['TOTAL_EMAILS'] > len(customer_emails):
+            st.caption(f"Showing the most recent {len(customer_emails)} of {profile_stats['TOTAL_EMAILS']} communications")
         timeline_fig = create_customer_journey_timeline(customer_emails)
         st.plotly_chart(timeline_fig, use_container_width=True)
         
@@ -492,7 +852,8 @@ def show_customer_profile(email_data, demographics_data, purchase_data):
                     st.write(f"**Urgency:** {email['RESPONSE_URGENCY']}")
                     st.write(f"**Escalation:** {'Yes' if email['ESCALATION_NEEDED'] else 'No'}")
 
-def show_analytics_deep_dive(email_data):
+@page_fragment
+def show_analytics_deep_dive(filters):
     """Advanced analytics and insights"""
     st.markdown("## 📈 Analytics Deep Dive")
     
@@ -500,37 +861,10 @@ def show_analytics_deep_dive(email_data):
     st.markdown("### 📊 Communication Trends Over Time")
     
     # Prepare time series data
-    email_data['DATE'] = email_data['DATE_RECEIVED'].dt.date
-    daily_stats = email_data.groupby('DATE').agg({
-        'EMAIL_ID': 'count',
-        'SENTIMENT_SCORE': 'mean',
-        'ESCALATION_NEEDED': 'sum'
-    }).reset_index()
-    daily_stats.columns = ['DATE', 'EMAIL_COUNT', 'AVG_SENTIMENT', 'ESCALATIONS']
+    daily_stats = load_daily_stats(*filters)
     
     # Create time series charts
-    fig_trends = make_subplots(
-        rows=3, cols=1,
-        subplot_titles=('Daily Email Volume', 'Average Sentiment', 'Daily Escalations'),
-        vertical_spacing=0.1
-    )
-    
-    fig_trends.add_trace(
-        go.Scatter(x=daily_stats['DATE'], y=daily_stats['EMAIL_COUNT'], name='Email Volume'),
-        row=1, col=1
-    )
-    
-    fig_trends.add_trace(
-        go.Scatter(x=daily_stats['DATE'], y=daily_stats['AVG_SENTIMENT'], name='Avg Sentiment', line=dict(color='green')),
-        row=2, col=1
-    )
-    
-    fig_trends.add_trace(
-        go.Scatter(x=daily_stats['DATE'], y=daily_stats['ESCALATIONS'], name='Escalations', line=dict(color='red')),
-        row=3, col=1
-    )
-    
-    fig_trends.update_layout(height=800)
+    fig_trends = create_daily_trends_chart(daily_stats)
     st.plotly_chart(fig_trends, use_container_width=True)
     
     # Correlation analysis
@@ -539,12 +873,12 @@ def show_analytics_deep_dive(email_data):
     with col1:
         st.markdown("### 🔗 Classification vs Sentiment Analysis")
         
-        sentiment_by_class = email_data.groupby(['EMAIL_CLASSIFICATION', 'SENTIMENT_CATEGORY']).size().reset_index(name='count')
+        sentiment_by_class = load_sentiment_by_class(*filters)
         
         fig_heatmap = px.treemap(
             sentiment_by_class,
             path=['EMAIL_CLASSIFICATION', 'SENTIMENT_CATEGORY'],
-            values='count',
+            values='EMAIL_COUNT',
             title="Communication Type vs Sentiment Distribution"
         )
         st.plotly_chart(fig_heatmap, use_container_width=True)
@@ -552,7 +886,7 @@ def show_analytics_deep_dive(email_data):
     with col2:
         st.markdown("### ⚡ Response Urgency Analysis")
         
-        urgency_sentiment = email_data.groupby('RESPONSE_URGENCY')['SENTIMENT_SCORE'].mean().reset_index()
+        urgency_sentiment = load_urgency_sentiment(*filters)
         
         fig_urgency = px.bar(
             urgency_sentiment,
@@ -567,106 +901,53 @@ def show_analytics_deep_dive(email_data):
     # Competitive intelligence
     st.markdown("### 🏆 Competitive Intelligence")
     
-    if 'COMPETITIVE_MENTIONS' in email_data.columns:
-        competitive_data = email_data[email_data['COMPETITIVE_MENTIONS'].notna() & (email_data['COMPETITIVE_MENTIONS'] != '')]
-        
-        if not competitive_data.empty:
-            comp_mentions = competitive_data['COMPETITIVE_MENTIONS'].value_counts().head(10)
-            
-            fig_comp = px.bar(
-                x=comp_mentions.values,
-                y=comp_mentions.index,
-                orientation='h',
-                title="🏆 Competitor Mentions in Customer Communications",
-                color=comp_mentions.values,
-                color_continuous_scale="reds"
-            )
-            st.plotly_chart(fig_comp, use_container_width=True)
+    comp_mentions = load_competitive_mentions(*filters)
+    
+    if not comp_mentions.empty:
+        fig_comp = px.bar(
+            x=comp_mentions['EMAIL_COUNT'],
+            y=comp_mentions['COMPETITIVE_MENTIONS'],
+            orientation='h',
+            title="🏆 Competitor Mentions in Customer Communications",
+            color=comp_mentions['EMAIL_COUNT'],
+            color_continuous_scale="reds"
+        )
+        st.plotly_chart(fig_comp, use_container_width=True)
 
-def show_ai_insights(email_data):
+@page_fragment
+def show_ai_insights(email_data, filters):
     """AI-powered insights and recommendations"""
     st.markdown("## 🤖 AI-Powered Customer Insights")
     
+    if email_data.empty:
+        st.info("No data in selected range.")
+        return
+    
     # AI Summary using Cortex Complete
     st.markdown("### 🧠 Executive AI Summary")
     
-    with st.spinner("Generating AI insights..."):
-        try:
-            # Prepare summary data for AI analysis
-            summary_data = {
-                'total_emails': len(email_data),
-                'avg_sentiment': email_data['SENTIMENT_SCORE'].mean(),
-                'escalation_rate': (email_data['ESCALATION_NEEDED'].sum() / len(email_data)) * 100,
-                'top_issues': email_data['EMAIL_CLASSIFICATION'].value_counts().head(3).to_dict(),
-                'urgent_responses': len(email_data[email_data['RESPONSE_URGENCY'] == 'immediate'])
-            }
-            
-            prompt = f"""
-            Analyze the following customer communication data and provide executive insights:
-            
-            Total Communications: {summary_data['total_emails']}
-            Average Sentiment Score: {summary_data['avg_sentiment']:.2f}
-            Escalation Rate: {summary_data['escalation_rate']:.1f}%
-            Top Issues: {summary_data['top_issues']}
-            Immediate Response Required: {summary_data['urgent_responses']}
-            
-            Provide:
-            1. Key insights about customer satisfaction
-            2. Recommendations for improving customer experience
-            3. Priority actions for the customer service team
-            """
-            
-            # For demo purposes, we'll use a mock response since Cortex Complete might not be available
-            ai_insights = """
-            ## Key Customer Insights:
-
-            **Customer Satisfaction Analysis:**
-            - Overall sentiment indicates moderate customer satisfaction with room for improvement
-            - Escalation rate suggests need for enhanced first-contact resolution
-            - Communication volume shows active customer engagement
-
-            **Priority Recommendations:**
-            1. **Immediate Actions**: Address urgent response communications within 24 hours
-            2. **Process Improvement**: Implement proactive communication for technical issues
-            3. **Training Focus**: Enhance team skills for handling complex inquiries
-            4. **Technology**: Leverage AI insights for predictive customer service
-
-            **Strategic Opportunities:**
-            - Develop customer success programs for high-value accounts
-            - Create knowledge base for common technical issues
-            - Implement sentiment-based routing for critical communications
-            """
-            
-            st.markdown(ai_insights)
-            
-        except Exception as e:
-            st.info("AI analysis temporarily unavailable. Showing manual insights.")
+    # Prepare summary data for AI analysis as a hashable cache key
+    summary_tuple = (
+        len(email_data),
+        round(email_data['SENTIMENT_SCORE'].mean(), 2),
+        round((email_data['ESCALATION_NEEDED'].sum() / len(email_data)) * 100, 1),
+        tuple(email_data['EMAIL_CLASSIFICATION'].value_counts().head(3).items()),
+        len(email_data[email_data['RESPONSE_URGENCY'] == 'immediate'])
+    )
+    
+    try:
+        ai_insights = generate_ai_summary(summary_tuple)
+    except Exception as e:
+        st.info("AI analysis temporarily unavailable. Showing manual insights.")
+        ai_insights = MANUAL_AI_INSIGHTS
+    
+    st.markdown(ai_insights)
     
     # Customer Segmentation
     st.markdown("### 🎯 AI-Powered Customer Segmentation")
     
-    # Create customer segments based on communication patterns
-    customer_segments = email_data.groupby('CUSTOMER_ID').agg({
-        'SENTIMENT_SCORE': 'mean',
-        'ESCALATION_NEEDED': 'sum',
-        'EMAIL_ID': 'count',
-        'RESPONSE_URGENCY': lambda x: (x == 'immediate').sum()
-    }).reset_index()
-    
-    customer_segments.columns = ['CUSTOMER_ID', 'AVG_SENTIMENT', 'TOTAL_ESCALATIONS', 'TOTAL_EMAILS', 'URGENT_EMAILS']
-    
-    # Define segments
-    def categorize_customer(row):
-        if row['TOTAL_ESCALATIONS'] > 2 or row['AVG_SENTIMENT'] < -0.3:
-            return "🔴 High Risk"
-        elif row['AVG_SENTIMENT'] > 0.3 and row['TOTAL_ESCALATIONS'] == 0:
-            return "🟢 Champions"
-        elif row['URGENT_EMAILS'] > 1:
-            return "🟡 Needs Attention"
-        else:
-            return "🔵 Standard"
-    
-    customer_segments['SEGMENT'] = customer_segments.apply(categorize_customer, axis=1)
+    # Customer segments are computed in Snowflake from communication patterns
+    customer_segments = load_customer_segments(*filters)
     
     # Segment visualization
     segment_counts = customer_segments['SEGMENT'].value_counts()
@@ -707,19 +988,25 @@ def show_ai_insights(email_data):
     ]['CUSTOMER_ID'].tolist()
     
     if at_risk_customers:
-        at_risk_details = email_data[email_data['CUSTOMER_ID'].isin(at_risk_customers)]
-        
         st.warning(f"⚠️ {len(at_risk_customers)} customers identified as at-risk for churn")
         
-        for customer_id in at_risk_customers[:5]:  # Show top 5
-            customer_data = at_risk_details[at_risk_details['CUSTOMER_ID'] == customer_id]
-            customer_name = customer_data['CUSTOMER_NAME'].iloc[0] if not customer_data['CUSTOMER_NAME'].empty else "Unknown"
+        # Latest email per at-risk customer; email_data is already newest first
+        latest_issues = (
+            email_data[email_data['CUSTOMER_ID'].isin(at_risk_customers[:5])]  # Show top 5
+            .drop_duplicates('CUSTOMER_ID')
+            .set_index('CUSTOMER_ID')
+            .reindex(at_risk_customers[:5])
+        )
+        
+        for latest_issue in latest_issues.itertuples():
+            customer_name = latest_issue.CUSTOMER_NAME if pd.notna(latest_issue.CUSTOMER_NAME) else "Unknown"
             
-            with st.expander(f"🚨 {customer_name} (ID: {customer_id})"):
-                latest_issue = customer_data.iloc[0]
-                st.write(f"**Latest Issue:** {latest_issue['EMAIL_CLASSIFICATION']}")
-                st.write(f"**Summary:** {latest_issue['EXECUTIVE_SUMMARY']}")
-                st.write(f"**Recommended Action:** {latest_issue['NEXT_STEPS']}")
+            with st.expander(f"🚨 {customer_name} (ID: {latest_issue.Index})"):
+                st.markdown(
+                    f"**Latest Issue:** {latest_issue.EMAIL_CLASSIFICATION}  \n"
+                    f"**Summary:** {latest_issue.EXECUTIVE_SUMMARY}  \n"
+                    f"**Recommended Action:** {latest_issue.NEXT_STEPS}"
+                )
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file